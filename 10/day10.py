@@ -1,5 +1,7 @@
 from pathlib import Path
 
+import numpy as np
+
 input_text = (Path(__file__).parent / "input.txt").read_text()
 
 input_grid = [
@@ -7,97 +9,79 @@ input_grid = [
 ]
 
 
-potential_trailhead_locations = []
-
-for y, yline in enumerate(input_grid):
-    for x, location_contents in enumerate(yline):
-        if location_contents == 0:
-            potential_trailhead_locations.append((x, y))
-
-
-def get_num_reachable_trailheads(
-    trailhead_loc: tuple[int, int], grid: list[list[int]]
-) -> int:
-    exploration_stack = [trailhead_loc]
-    explored_set: set[tuple[int, int]] = set()
-    nine_locations: set[tuple[int, int]] = set()
-
-    while len(exploration_stack) > 0:
-        current_loc = exploration_stack.pop()
-        if current_loc not in explored_set:
-            explored_set.add(current_loc)
-
-            val = grid[current_loc[1]][current_loc[0]]
-            if val == 9:
-                nine_locations.add(current_loc)
-                continue
-            if val == -1:
-                continue
-            # add left, right, up, down to the stack
-            if current_loc[0] > 0:
-                coord = (current_loc[0] - 1, current_loc[1])
-                if grid[coord[1]][coord[0]] == val + 1:
-                    exploration_stack.append(coord)
-            if current_loc[0] < len(grid[0]) - 1:
-                coord = (current_loc[0] + 1, current_loc[1])
-                if grid[coord[1]][coord[0]] == val + 1:
-                    exploration_stack.append(coord)
-            if current_loc[1] > 0:
-                coord = (current_loc[0], current_loc[1] - 1)
-                if grid[coord[1]][coord[0]] == val + 1:
-                    exploration_stack.append(coord)
-            if current_loc[1] < len(grid) - 1:
-                coord = (current_loc[0], current_loc[1] + 1)
-                if grid[coord[1]][coord[0]] == val + 1:
-                    exploration_stack.append(coord)
-
-    return len(nine_locations)
-
-
-trailhead_sum = sum(
-    (
-        get_num_reachable_trailheads(loc, input_grid)
-        for loc in potential_trailhead_locations
-    )
-)
+def sum_neighbors(values: np.ndarray) -> np.ndarray:
+    # Adds up each cell's four orthogonal neighbors by shifting the whole grid
+    neighbor_sum = np.zeros_like(values)
+    neighbor_sum[1:, :] += values[:-1, :]
+    neighbor_sum[:-1, :] += values[1:, :]
+    neighbor_sum[:, 1:] += values[:, :-1]
+    neighbor_sum[:, :-1] += values[:, 1:]
+    return neighbor_sum
+
+
+def get_trailhead_scores(grid: np.ndarray) -> np.ndarray:
+    # Gives each 9 its own bit, numbered in reading order, and works down one
+    # height at a time, OR-ing together the reachable-9 bitsets of each cell's
+    # neighbors one step higher. Each cell is visited once, and a trailhead's
+    # score is the popcount of its bitset.
+    #
+    # A 9 is never more than 9 rows away from a cell that can reach it, so a
+    # cell's bitset is stored relative to the first 9 in the row 9 above it.
+    # That keeps every bitset about 19 rows of 9s wide however big the grid is.
+    height, width = grid.shape
+    nines_before_row = np.concatenate(([0], np.cumsum(np.sum(grid == 9, axis=1))))
+    # Padded with a row either side so neighbors off the grid need no checks
+    bases = [0] + [int(nines_before_row[max(0, y - 9)]) for y in range(height)] + [0]
+
+    # Flat cells with a padding column on the right, so x - 1 and x + 1 off
+    # the grid land on padding; padding is never at a height we look for
+    padded_width = width + 1
+    heights = np.full((height + 2, padded_width), -1, dtype=np.int64)
+    heights[1:-1, :width] = grid
+    flat_heights = heights.ravel().tolist()
+    reachable = [0] * len(flat_heights)
+
+    nine_positions = np.flatnonzero(heights == 9).tolist()
+    for bit, pos in enumerate(nine_positions):
+        reachable[pos] = 1 << (bit - bases[pos // padded_width])
+
+    for layer_height in reversed(range(9)):
+        uphill = layer_height + 1
+        for pos in np.flatnonzero(heights == layer_height).tolist():
+            row = pos // padded_width
+            row_base = bases[row]
+            bits = 0
+            if flat_heights[pos - 1] == uphill:
+                bits |= reachable[pos - 1]
+            if flat_heights[pos + 1] == uphill:
+                bits |= reachable[pos + 1]
+            # Shifting the row above down can't drop any 9 this cell reaches
+            if flat_heights[pos - padded_width] == uphill:
+                bits |= reachable[pos - padded_width] >> (row_base - bases[row - 1])
+            if flat_heights[pos + padded_width] == uphill:
+                bits |= reachable[pos + padded_width] << (bases[row + 1] - row_base)
+            reachable[pos] = bits
+
+    scores = np.array([bits.bit_count() for bits in reachable], dtype=np.int64)
+    scores = np.where(heights == 0, scores.reshape(heights.shape), 0)
+    return scores[1:-1, :width]
+
+
+def get_trailhead_ratings(grid: np.ndarray) -> np.ndarray:
+    # Works down from the 9s one height at a time: a cell's rating is the sum
+    # of the ratings of its neighbors one step higher, and only cells at the
+    # previous height are non-zero when summing. Returns the rating of every
+    # cell, so the trailheads are the non-zero entries where grid == 0.
+    ratings = (grid == 9).astype(np.int64)
+    for height in reversed(range(9)):
+        ratings = np.where(grid == height, sum_neighbors(ratings), 0)
+    return ratings
+
+
+grid = np.array(input_grid)
+
+trailhead_sum = int(get_trailhead_scores(grid).sum())
 # print(trailhead_sum)
 
-
-def get_trailhead_rating(trailhead_loc: tuple[int, int], grid: list[list[int]]) -> int:
-    unique_paths_to_nines: set[tuple[tuple[int, int], ...]] = set()
-
-    def explore(current_loc: tuple[int, int], path: list[tuple[int, int]]):
-        val = grid[current_loc[1]][current_loc[0]]
-        if val == 9:
-            path.append(current_loc)
-            unique_paths_to_nines.add(tuple(path))
-            return
-        if val == -1:
-            return
-
-        path.append(current_loc)
-        if current_loc[0] > 0:
-            coord = (current_loc[0] - 1, current_loc[1])
-            if grid[coord[1]][coord[0]] == val + 1:
-                explore(coord, path)
-        if current_loc[0] < len(grid[0]) - 1:
-            coord = (current_loc[0] + 1, current_loc[1])
-            if grid[coord[1]][coord[0]] == val + 1:
-                explore(coord, path)
-        if current_loc[1] > 0:
-            coord = (current_loc[0], current_loc[1] - 1)
-            if grid[coord[1]][coord[0]] == val + 1:
-                explore(coord, path)
-        if current_loc[1] < len(grid) - 1:
-            coord = (current_loc[0], current_loc[1] + 1)
-            if grid[coord[1]][coord[0]] == val + 1:
-                explore(coord, path)
-
-    explore(trailhead_loc, [])
-    return len(unique_paths_to_nines)
-
-
-rating_sum = sum(
-    (get_trailhead_rating(loc, input_grid) for loc in potential_trailhead_locations)
-)
+rating_sum = int(get_trailhead_ratings(grid).sum())
 print(rating_sum)
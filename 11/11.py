@@ -1,49 +1,216 @@
-from functools import cache
-
-
-def calculate_num_stones_after_timestep(input: list[int], timesteps: int) -> list[int]:
-    nums = input.copy()
-    for timestep in range(timesteps):
-        print(timestep, len(nums))
-        new_nums = []
-        for num in nums:
-            string_rep = str(num)
-            if num == 0:
-                new_nums.append(1)
-            elif len(string_rep) % 2 == 0:
-                new_nums.extend(
-                    [
-                        int(string_rep[: len(string_rep) // 2]),
-                        int(string_rep[len(string_rep) // 2 :]),
-                    ]
-                )
-            else:
-                new_nums.append(num * 2024)
-        nums = new_nums
-
-    return nums
+from collections import Counter, OrderedDict, defaultdict
+from collections.abc import Iterator
+from pathlib import Path
+import json
+import sys
+import tempfile
 
+import numpy as np
 
-input = [3935565, 31753, 437818, 7697, 5, 38, 0, 123]
 
-print(len(calculate_num_stones_after_timestep(input, 25)))
+def count_digits(num: int) -> int:
+    digits = 1
+    power = 10
+    while power <= num:
+        power *= 10
+        digits += 1
+    return digits
 
 
-@cache
-def calculate_num_stones_recursive(num: int, timestep: int) -> int:
-    if timestep == 0:
-        return 1
+def blink(num: int) -> tuple[int, ...]:
     if num == 0:
-        return calculate_num_stones_recursive(1, timestep - 1)
-    elif len(str(num)) % 2 == 0:
-        string_rep = str(num)
-        return calculate_num_stones_recursive(
-            int(string_rep[: len(string_rep) // 2]), timestep - 1
-        ) + calculate_num_stones_recursive(
-            int(string_rep[len(string_rep) // 2 :]), timestep - 1
+        return (1,)
+    digits = count_digits(num)
+    if digits % 2 == 0:
+        return divmod(num, 10 ** (digits // 2))
+    return (num * 2024,)
+
+
+def iter_stone_buckets(input: list[int], timesteps: int) -> Iterator[dict[int, int]]:
+    # Stones with the same value always evolve the same way, so only a count
+    # per distinct value is kept. Yields the value -> count map after each blink.
+    buckets = dict(Counter(input))
+    for _ in range(timesteps):
+        new_buckets: dict[int, int] = defaultdict(int)
+        for num, count in buckets.items():
+            for new_num in blink(num):
+                new_buckets[new_num] += count
+        buckets = new_buckets
+        yield buckets
+
+
+def calculate_stone_counts(input: list[int], timesteps: int) -> list[tuple[int, int]]:
+    # (number of stones, number of distinct values) after each blink
+    return [
+        (sum(buckets.values()), len(buckets))
+        for buckets in iter_stone_buckets(input, timesteps)
+    ]
+
+
+input = [3935565, 31753, 437818, 7697, 5, 38, 0, 123]
+
+print(calculate_stone_counts(input, 25)[-1][0])
+
+
+class StoneMemo:
+    # Bounded (num, timestep) -> stone count memo that evicts the least
+    # recently used entry once it's full. It can be saved to and loaded from a
+    # JSON file, since the counts don't depend on which seeds asked for them.
+    # Counts are stored as hex strings: after ~25k blinks they pass the 4300
+    # digit limit on decimal int/str conversion, which doesn't apply to hex.
+    def __init__(self, max_size: int = 1_000_000, path: Path | None = None):
+        self.max_size = max_size
+        self.entries: OrderedDict[tuple[int, int], int] = OrderedDict()
+        if path is not None and path.exists():
+            self.load(path)
+
+    def get(self, key: tuple[int, int]) -> int | None:
+        count = self.entries.get(key)
+        if count is not None:
+            self.entries.move_to_end(key)
+        return count
+
+    def put(self, key: tuple[int, int], count: int):
+        self.entries[key] = count
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def load(self, path: Path):
+        for num, timestep, count in json.loads(path.read_text()):
+            self.put((num, timestep), int(count, 16))
+
+    def save(self, path: Path):
+        path.write_text(
+            json.dumps(
+                [
+                    [num, timestep, format(count, "x")]
+                    for (num, timestep), count in self.entries.items()
+                ]
+            )
         )
-    else:
-        return calculate_num_stones_recursive(num * 2024, timestep - 1)
 
 
-print(sum([calculate_num_stones_recursive(num, 75) for num in input]))
+def calculate_num_stones(num: int, timesteps: int, memo: StoneMemo) -> int:
+    # Depth first with an explicit stack instead of recursion, so the number
+    # of timesteps isn't limited by the recursion limit. Each frame is
+    # [num, timestep, children still to count, total so far]; the totals live
+    # on the stack, so it's fine for the memo to evict anything at any time.
+    stack: list[list] = [[num, timesteps, None, 0]]
+    result = 0
+    while stack:
+        frame = stack[-1]
+        frame_num, timestep, children, total = frame
+        if children is None:
+            count = 1 if timestep == 0 else memo.get((frame_num, timestep))
+            if count is None:
+                frame[2] = list(blink(frame_num))
+                continue
+        elif children:
+            stack.append([children.pop(), timestep - 1, None, 0])
+            continue
+        else:
+            count = total
+            memo.put((frame_num, timestep), count)
+
+        stack.pop()
+        if stack:
+            stack[-1][3] += count
+        else:
+            result = count
+
+    return result
+
+
+memo = StoneMemo()
+print(sum([calculate_num_stones(num, 75, memo) for num in input]))
+
+# Saving and loading must survive counts well past the 4300 digit limit
+with tempfile.TemporaryDirectory() as memo_dir:
+    memo_path = Path(memo_dir) / "memo.json"
+    big_memo = StoneMemo()
+    big_memo.put((0, 30000), 7**6000)
+    big_memo.save(memo_path)
+    assert StoneMemo(path=memo_path).get((0, 30000)) == 7**6000
+
+
+def find_value_closure(seeds: list[int]) -> list[int]:
+    # Every value reachable from the seeds, in the order they're discovered
+    values = list(dict.fromkeys(seeds))
+    seen = set(values)
+    for num in values:
+        for new_num in blink(num):
+            if new_num not in seen:
+                seen.add(new_num)
+                values.append(new_num)
+    return values
+
+
+def build_transition_matrix(values: list[int]) -> dict[int, dict[int, int]]:
+    # Sparse rows: matrix[i][j] is how many stones of values[j] a single
+    # stone of values[i] turns into after one blink
+    index = {num: i for i, num in enumerate(values)}
+    matrix: dict[int, dict[int, int]] = {}
+    for i, num in enumerate(values):
+        row: dict[int, int] = defaultdict(int)
+        for new_num in blink(num):
+            row[index[new_num]] += 1
+        matrix[i] = row
+    return matrix
+
+
+def multiply_mod(a: np.ndarray, b: np.ndarray, modulus: int) -> np.ndarray:
+    # float64 matmuls are exact while every dot product stays below 2**53, so
+    # b is split into limbs narrow enough for that and recombined mod p
+    limb_bits = 53 - (a.shape[1] * (modulus - 1)).bit_length()
+    assert limb_bits > 0 and modulus < 2**31
+    a_float = a.astype(np.float64)
+    product = np.zeros((a.shape[0], b.shape[1]), dtype=np.int64)
+    for shift in range(0, (modulus - 1).bit_length(), limb_bits):
+        limb = ((b >> shift) & ((1 << limb_bits) - 1)).astype(np.float64)
+        partial = np.fmod(a_float @ limb, modulus).astype(np.int64)
+        product = (product + partial * pow(2, shift, modulus)) % modulus
+    return product
+
+
+def calculate_num_stones_jump_ahead(
+    seeds: list[int], timesteps: int, modulus: int
+) -> int:
+    # The stone counts evolve linearly over a closed set of values, so modulo
+    # a prime below 2**31, N blinks are the count vector times the Nth power of
+    # the transition matrix, found by squaring dense NumPy matrices in
+    # O(log N) multiplications. Exact counts aren't bounded like that, so those
+    # go through calculate_stone_counts, one blink at a time.
+    if not 2 <= modulus < 2**31:
+        raise ValueError(f"modulus must be a prime below 2**31, got {modulus}")
+
+    values = find_value_closure(seeds)
+    matrix = build_transition_matrix(values)
+    counts = Counter(values.index(num) for num in seeds)
+
+    dense_matrix = np.zeros((len(values), len(values)), dtype=np.int64)
+    for i, row in matrix.items():
+        for j, count in row.items():
+            dense_matrix[i, j] = count % modulus
+    dense_vector = np.zeros((1, len(values)), dtype=np.int64)
+    for i, count in counts.items():
+        dense_vector[0, i] = count % modulus
+
+    while timesteps:
+        if timesteps & 1:
+            dense_vector = multiply_mod(dense_vector, dense_matrix, modulus)
+        timesteps >>= 1
+        if timesteps:
+            dense_matrix = multiply_mod(dense_matrix, dense_matrix, modulus)
+    return int(dense_vector.sum() % modulus)
+
+
+if __name__ == "__main__":
+    # e.g. `python 11.py 1000000 1000000007` for the count after a million blinks
+    # modulo 1000000007, or `python 11.py 3000` for the exact count after 3000
+    if len(sys.argv) > 2:
+        print(
+            calculate_num_stones_jump_ahead(input, int(sys.argv[1]), int(sys.argv[2]))
+        )
+    elif len(sys.argv) > 1:
+        print(calculate_stone_counts(input, int(sys.argv[1]))[-1][0])
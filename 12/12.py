@@ -1,170 +1,138 @@
 from pathlib import Path
-from typing import Literal
-
-input_text = (Path(__file__).parent / "input.txt").read_text()
-
-input_grid = [list(line) for line in input_text.splitlines()]
-
-type Direction = Literal["N", "E", "S", "W"]
-type Coordinate = tuple[int, int]
-
-directions: list[Direction] = ["N", "E", "S", "W"]
-
-
-def get_relative_coord(coord: Coordinate, direction: Direction) -> Coordinate:
-    match direction:
-        case "E":
-            return (coord[0] + 1, coord[1])
-        case "N":
-            return (coord[0], coord[1] - 1)
-        case "S":
-            return (coord[0], coord[1] + 1)
-        case "W":
-            return (coord[0] - 1, coord[1])
-
-
-def get_perpendicular_directions(direction: Direction) -> tuple[Direction, Direction]:
-    match direction:
-        case "E" | "W":
-            return ("N", "S")
-        case "N" | "S":
-            return ("E", "W")
+from dataclasses import dataclass
 
+import numpy as np
 
-# Let's do some flood filling
-# Flood fill all connected elements and then change the elements to use a marker
-
-
-def get_region_elements(
-    original_pos: Coordinate, grid: list[list[str]]
-) -> set[Coordinate]:
-    region_coordinates: set[Coordinate] = set()
-    original_region = grid[original_pos[1]][original_pos[0]]
-
-    def explore(pos: Coordinate):
-        if pos in region_coordinates:
-            return
-
-        r = grid[pos[1]][pos[0]]
-        if r != original_region:
-            return
+input_text = (Path(__file__).parent / "input.txt").read_text()
 
-        region_coordinates.add(pos)
 
-        for direction in directions:
-            new_coord = get_relative_coord(pos, direction)
-            if (
-                new_coord[0] >= 0
-                and new_coord[0] < len(grid)
-                and new_coord[1] >= 0
-                and new_coord[1] < len(grid[0])
-            ):
-                explore(new_coord)
+def load_garden(input_text: str) -> np.ndarray:
+    lines = input_text.splitlines()
+    assert all([len(line) == len(lines[0]) for line in lines])
+    return np.frombuffer("".join(lines).encode("ascii"), dtype=np.uint8).reshape(
+        len(lines), len(lines[0])
+    )
+
+
+def label_regions(garden: np.ndarray) -> tuple[np.ndarray, int]:
+    # Scanline labeling without recursion: each row is split into runs of the
+    # same plant, runs that touch a run of the same plant in the row above are
+    # joined with union-find, and then every run is painted with its region id.
+    # Returns the label array and the number of regions.
+    height, width = garden.shape
+    parent: list[int] = []
+
+    def find(run: int) -> int:
+        while parent[run] != run:
+            parent[run] = parent[parent[run]]
+            run = parent[run]
+        return run
+
+    row_runs: list[tuple[int, np.ndarray]] = []
+    previous_row: tuple[int, list[int], list[int]] | None = None
+    for y in range(height):
+        row = garden[y]
+        starts = np.flatnonzero(np.concatenate(([True], row[1:] != row[:-1])))
+        ends = np.append(starts[1:], width)
+        first_run = len(parent)
+        parent.extend(range(first_run, first_run + len(starts)))
+        row_runs.append((first_run, ends - starts))
+
+        run_ends = ends.tolist()
+        run_plants = row[starts].tolist()
+        if previous_row is not None:
+            # Both rows' runs tile the row left to right, so stepping past
+            # whichever run ends first visits every overlapping pair once
+            previous_first_run, previous_ends, previous_plants = previous_row
+            i = j = 0
+            while i < len(run_ends) and j < len(previous_ends):
+                if run_plants[i] == previous_plants[j]:
+                    root = find(first_run + i)
+                    previous_root = find(previous_first_run + j)
+                    if root != previous_root:
+                        parent[root] = previous_root
+                run_end = run_ends[i]
+                previous_end = previous_ends[j]
+                if run_end <= previous_end:
+                    i += 1
+                if previous_end <= run_end:
+                    j += 1
+        previous_row = (first_run, run_ends, run_plants)
+
+    region_ids: dict[int, int] = {}
+    run_labels = np.array(
+        [
+            region_ids.setdefault(find(run), len(region_ids))
+            for run in range(len(parent))
+        ]
+    )
+    labels = np.empty((height, width), dtype=np.int64)
+    for y, (first_run, run_lengths) in enumerate(row_runs):
+        labels[y] = np.repeat(
+            run_labels[first_run : first_run + len(run_lengths)], run_lengths
+        )
+    return labels, len(region_ids)
 
-    explore(original_pos)
-    return region_coordinates
 
+@dataclass
+class RegionTable:
+    # Per-region metrics, indexed by region label
+    area: np.ndarray
+    perimeter: np.ndarray
+    sides: np.ndarray
 
-def get_region_coordinates_for_grid(
-    input_grid: list[list[str]],
-) -> set[frozenset[Coordinate]]:
-    explored_positions: set[Coordinate] = set()
-    region_coordinates: set[frozenset[Coordinate]] = set()
-    for y in range(len(input_grid)):
-        for x in range(len(input_grid[y])):
-            if (x, y) in explored_positions:
-                continue
-            coords = get_region_elements((x, y), input_grid)
-            explored_positions.update(coords)
-            region_coordinates.add(frozenset(coords))
-    return region_coordinates
+    @property
+    def price(self) -> np.ndarray:
+        return self.area * self.perimeter
 
+    @property
+    def bulk_price(self) -> np.ndarray:
+        return self.area * self.sides
 
-region_coordinates = get_region_coordinates_for_grid(input_grid)
 
+def measure_regions(labels: np.ndarray, num_regions: int) -> RegionTable:
+    # Pad with a label no region has so the map's edge counts as a boundary
+    padded = np.pad(labels, 1, constant_values=-1)
+    height, width = labels.shape
 
-def calculate_perimeter(positions: set[Coordinate]) -> int:
-    calculated_coords: set[Coordinate] = set()
+    def neighbors(dx: int, dy: int) -> np.ndarray:
+        return padded[1 + dy : 1 + dy + height, 1 + dx : 1 + dx + width]
 
-    def explore(pos: Coordinate) -> int:
-        if pos in calculated_coords:
-            return 0
-        if pos not in positions:
-            return 1
+    area = np.bincount(labels.ravel(), minlength=num_regions)
 
-        calculated_coords.add(pos)
-        return sum(
-            [explore(get_relative_coord(pos, direction)) for direction in directions]
+    # Every side of a cell facing a different region is a stretch of fence
+    perimeter = np.zeros(num_regions, dtype=np.int64)
+    for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+        perimeter += np.bincount(
+            labels[neighbors(dx, dy) != labels], minlength=num_regions
         )
 
-    return explore(next(iter(positions)))
+    # A region has as many sides as corners. Looking at each cell's corner in
+    # the 2x2 window with its neighbors, it's an outer corner if neither
+    # orthogonal neighbor is in the region, and an inner corner if both are
+    # but the diagonal neighbor isn't.
+    sides = np.zeros(num_regions, dtype=np.int64)
+    for dx, dy in ((1, 1), (1, -1), (-1, 1), (-1, -1)):
+        horizontal = neighbors(dx, 0) == labels
+        vertical = neighbors(0, dy) == labels
+        diagonal = neighbors(dx, dy) == labels
+        corners = (~horizontal & ~vertical) | (horizontal & vertical & ~diagonal)
+        sides += np.bincount(labels[corners], minlength=num_regions)
 
+    return RegionTable(area, perimeter, sides)
 
-price_sum = sum(
-    [(len(coords) * calculate_perimeter(set(coords))) for coords in region_coordinates]
-)
-print(price_sum)
 
+region_table = measure_regions(*label_regions(load_garden(input_text)))
 
-# Equivalent to counting corners
-def calculate_num_sides(positions: set[Coordinate], input_grid: list[list[str]]) -> int:
-    explored_coordinates: set[Coordinate] = set()
-
-    def explore(position: Coordinate) -> int:
-        corners = 0
-
-        explored_coordinates.add(position)
-        for direction_one, direction_two in zip(
-            directions, [*directions[1:], directions[0]]
-        ):
-            relative_coord_one = get_relative_coord(position, direction_one)
-            relative_coord_two = get_relative_coord(position, direction_two)
-            # If there isn't an edge in the direction, continue
-            if (
-                relative_coord_one not in positions
-                and relative_coord_two not in positions
-            ):
-                corners += 1
-
-            # Look for the other type of corner
-            corner_pos = (
-                relative_coord_one[0]
-                if relative_coord_one[0] != position[0]
-                else relative_coord_two[0],
-                relative_coord_one[1]
-                if relative_coord_one[1] != position[1]
-                else relative_coord_two[1],
-            )
-
-            if (
-                relative_coord_one in positions
-                and relative_coord_two in positions
-                and corner_pos not in positions
-            ):
-                corners += 1
-
-        for direction in directions:
-            new_coord = get_relative_coord(position, direction)
-            if new_coord not in explored_coordinates and new_coord in positions:
-                corners += explore(new_coord)
-
-        return corners
-
-    return explore(next(iter(positions)))
+price_sum = int(region_table.price.sum())
+print(price_sum)
 
 
 def get_cost_for_file(filename: str) -> int:
     input_text = (Path(__file__).parent / filename).read_text()
 
-    input_grid = [list(line) for line in input_text.splitlines()]
-    region_coordinates = get_region_coordinates_for_grid(input_grid)
-    price_sum = 0
-    for coords in region_coordinates:
-        area = len(coords)
-        num_sides = calculate_num_sides(set(coords), input_grid)
-        price_sum += area * num_sides
-
-    return price_sum
+    region_table = measure_regions(*label_regions(load_garden(input_text)))
+    return int(region_table.bulk_price.sum())
 
 
 assert get_cost_for_file("test1.txt") == 80
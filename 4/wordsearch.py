@@ -1,59 +1,378 @@
+import itertools
+import mmap
 import sys
 
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+import numpy as np
 
-def find_horizontal_instances(grid: list[list[str]], search_term: str) -> int:
-    found = 0
-    for line in grid:
-        for i in range(0, len(line) - len(search_term) + 1):
-            substring = "".join(line[i : i + len(search_term)])
-            if substring == search_term or substring[::-1] == search_term:
-                found += 1
-    return found
+# (dx, dy) steps for all 8 reading directions
+DIRECTIONS: list[tuple[int, int]] = [
+    (1, 0),
+    (-1, 0),
+    (0, 1),
+    (0, -1),
+    (1, 1),
+    (-1, -1),
+    (-1, 1),
+    (1, -1),
+]
 
 
-def find_diagonal_instances_left_to_right(
-    grid: list[list[str]], search_term: str
+def load_grid(file_contents: str) -> np.ndarray:
+    lines = file_contents.split()
+    line_lengths = [len(line) for line in lines]
+    assert all([length == line_lengths[0] for length in line_lengths])
+
+    return np.frombuffer("".join(lines).encode("ascii"), dtype=np.uint8).reshape(
+        len(lines), line_lengths[0]
+    )
+
+
+def map_grid(buffer: mmap.mmap, check_rows: bool = True) -> np.ndarray:
+    # View the raw file bytes as a (rows, columns) grid, skipping over the line
+    # endings via the row stride, so the grid is never copied into memory
+    line_end = buffer.find(b"\n")
+    if line_end == -1:
+        line_end = len(buffer)
+    width = (
+        line_end - 1 if line_end > 0 and buffer[line_end - 1] == ord("\r") else line_end
+    )
+    assert width > 0
+    stride = line_end + 1
+    height = (len(buffer) - width) // stride + 1
+
+    # Only the first line's length was measured, so check that every row ends
+    # where that says it should (the final newline is optional). Workers of
+    # solve_banded skip this, since the whole file was checked up front.
+    if check_rows:
+        line_ending = b"\r\n" if stride - width == 2 else b"\n"
+        if len(buffer) not in (height * stride, height * stride - len(line_ending)):
+            raise ValueError("grid rows have different lengths")
+        endings = np.ndarray(
+            shape=((len(buffer) - width) // stride, len(line_ending)),
+            dtype=np.uint8,
+            buffer=buffer,
+            offset=width,
+            strides=(stride, 1),
+        )
+        if not (endings == np.frombuffer(line_ending, dtype=np.uint8)).all():
+            raise ValueError("grid rows have different lengths")
+
+    return np.ndarray(
+        shape=(height, width), dtype=np.uint8, buffer=buffer, strides=(stride, 1)
+    )
+
+
+def find_instances_in_direction(
+    grid: np.ndarray, search_term: str, direction: tuple[int, int]
+) -> np.ndarray:
+    # Returns a mask indexed by the top-left corner of each match's bounding box
+    height, width = grid.shape
+    dx, dy = direction
+    span_x = (len(search_term) - 1) * abs(dx)
+    span_y = (len(search_term) - 1) * abs(dy)
+    if span_x >= width or span_y >= height:
+        return np.zeros((0, 0), dtype=bool)
+
+    # Row/column of the first letter inside the shifted window; when reading
+    # backwards the first letter sits at the far end of the span.
+    origin_x = span_x if dx < 0 else 0
+    origin_y = span_y if dy < 0 else 0
+
+    matches = np.ones((height - span_y, width - span_x), dtype=bool)
+    for i, char in enumerate(search_term.encode("ascii")):
+        y = origin_y + i * dy
+        x = origin_x + i * dx
+        matches &= grid[y : y + height - span_y, x : x + width - span_x] == char
+
+    return matches
+
+
+def count_instances_in_direction(
+    grid: np.ndarray,
+    search_term: str,
+    direction: tuple[int, int],
+    top_row_limit: int | None = None,
 ) -> int:
-    found = 0
-    line_length = len(grid[0])
-    for x_start in range(0, line_length - len(search_term) + 1):
-        for y_start in range(0, line_length - len(search_term) + 1):
-            chars = []
-            for i in range(len(search_term)):
-                chars.append(grid[x_start + i][y_start + i])
-            substring = "".join(chars)
-            if substring == search_term or substring[::-1] == search_term:
-                found += 1
+    matches = find_instances_in_direction(grid, search_term, direction)
+    return int(np.count_nonzero(matches[:top_row_limit]))
 
-    return found
+
+def count_instances(
+    grid: np.ndarray, search_term: str, top_row_limit: int | None = None
+) -> int:
+    return sum(
+        count_instances_in_direction(grid, search_term, direction, top_row_limit)
+        for direction in DIRECTIONS
+    )
+
+
+def count_x_instances(
+    grid: np.ndarray, search_term: str, top_row_limit: int | None = None
+) -> int:
+    down_right = find_instances_in_direction(
+        grid, search_term, (1, 1)
+    ) | find_instances_in_direction(grid, search_term, (-1, -1))
+    down_left = find_instances_in_direction(
+        grid, search_term, (-1, 1)
+    ) | find_instances_in_direction(grid, search_term, (1, -1))
+    return int(np.count_nonzero((down_right & down_left)[:top_row_limit]))
+
+
+def build_letter_index(grid: np.ndarray) -> dict[int, tuple[np.ndarray, np.ndarray]]:
+    # Group every cell by its letter in one stable (radix) sort, giving the
+    # (rows, columns) of each letter's positions in reading order
+    flat = grid.ravel()
+    order = np.argsort(flat, kind="stable")
+    letters, starts = np.unique(flat[order], return_index=True)
+    return {
+        int(letter): np.divmod(positions, grid.shape[1])
+        for letter, positions in zip(letters, np.split(order, starts[1:]))
+    }
+
+
+def find_anchored_instances(
+    grid: np.ndarray,
+    letter_index: dict[int, tuple[np.ndarray, np.ndarray]],
+    search_term: str,
+    direction: tuple[int, int],
+) -> tuple[np.ndarray, np.ndarray]:
+    # Start from every cell holding the first letter and drop candidates
+    # letter by letter, so the work scales with the number of anchors
+    height, width = grid.shape
+    dx, dy = direction
+    term = search_term.encode("ascii")
+    empty = np.zeros(0, dtype=np.intp)
+    ys, xs = letter_index.get(term[0], (empty, empty))
+
+    end_x = xs + (len(term) - 1) * dx
+    end_y = ys + (len(term) - 1) * dy
+    in_bounds = (end_x >= 0) & (end_x < width) & (end_y >= 0) & (end_y < height)
+    ys, xs = ys[in_bounds], xs[in_bounds]
+
+    for i, char in enumerate(term[1:], start=1):
+        keep = grid[ys + i * dy, xs + i * dx] == char
+        ys, xs = ys[keep], xs[keep]
+
+    return ys, xs
+
+
+def count_anchored_instances(
+    grid: np.ndarray,
+    letter_index: dict[int, tuple[np.ndarray, np.ndarray]],
+    search_term: str,
+) -> int:
+    return sum(
+        len(find_anchored_instances(grid, letter_index, search_term, direction)[0])
+        for direction in DIRECTIONS
+    )
+
+
+def count_anchored_x_instances(
+    grid: np.ndarray,
+    letter_index: dict[int, tuple[np.ndarray, np.ndarray]],
+    search_term: str,
+) -> int:
+    # Anchor on the centre letter and check both diagonals through it, each of
+    # which may read the term forwards or backwards
+    height, width = grid.shape
+    term = search_term.encode("ascii")
+    radius = len(term) // 2
+    empty = np.zeros(0, dtype=np.intp)
+    ys, xs = letter_index.get(term[radius], (empty, empty))
+
+    in_bounds = (
+        (xs >= radius) & (xs < width - radius) & (ys >= radius) & (ys < height - radius)
+    )
+    ys, xs = ys[in_bounds], xs[in_bounds]
+
+    found = np.ones(len(ys), dtype=bool)
+    for dx in (1, -1):
+        forwards = np.ones(len(ys), dtype=bool)
+        backwards = np.ones(len(ys), dtype=bool)
+        for i in range(len(term)):
+            cells = grid[ys + (i - radius), xs + (i - radius) * dx]
+            forwards &= cells == term[i]
+            backwards &= cells == term[-1 - i]
+        found &= forwards | backwards
+
+    return int(np.count_nonzero(found))
+
+
+def count_band(
+    path: Path,
+    band: tuple[int, int],
+    halo: int,
+    search_term: str,
+    x_search_term: str,
+) -> tuple[int, int]:
+    with (
+        path.open("rb") as f,
+        mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer,
+    ):
+        return count_band_in_buffer(buffer, band, halo, search_term, x_search_term)
+
+
+def count_band_in_buffer(
+    buffer: mmap.mmap,
+    band: tuple[int, int],
+    halo: int,
+    search_term: str,
+    x_search_term: str,
+) -> tuple[int, int]:
+    start, end = band
+    grid = map_grid(buffer, check_rows=False)[start : end + halo]
+    # Only count matches that start in this band's own rows; the halo rows
+    # below are there so those matches can be seen in full, and matches
+    # starting in the halo belong to the next band.
+    return (
+        count_instances(grid, search_term, end - start),
+        count_x_instances(grid, x_search_term, end - start),
+    )
+
+
+def solve_banded(
+    path: Path,
+    search_term: str,
+    x_search_term: str,
+    band_rows: int = 4096,
+    max_workers: int | None = None,
+) -> tuple[int, int]:
+    with (
+        path.open("rb") as f,
+        mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer,
+    ):
+        num_lines = len(map_grid(buffer))
+
+    halo = max(len(search_term), len(x_search_term)) - 1
+    bands = [
+        (start, min(start + band_rows, num_lines))
+        for start in range(0, num_lines, band_rows)
+    ]
+
+    with ProcessPoolExecutor(max_workers) as executor:
+        band_counts = list(
+            executor.map(
+                count_band,
+                itertools.repeat(path),
+                bands,
+                itertools.repeat(halo),
+                itertools.repeat(search_term),
+                itertools.repeat(x_search_term),
+            )
+        )
+
+    return (
+        sum(found for found, _ in band_counts),
+        sum(x_found for _, x_found in band_counts),
+    )
+
+
+class TermAutomaton:
+    def __init__(self, terms: list[str]):
+        self.terms = terms
+        # Trie nodes: byte -> child node, plus failure links and the indices of
+        # the terms that end at (or fail through to) each node
+        self.children: list[dict[int, int]] = [{}]
+        self.fail: list[int] = [0]
+        self.outputs: list[list[int]] = [[]]
+
+        # Add each term forwards and backwards so a single forward pass over a
+        # line also counts the term read in the opposite direction
+        for term_index, term in enumerate(terms):
+            self._add_pattern(term.encode("ascii"), term_index)
+            self._add_pattern(term[::-1].encode("ascii"), term_index)
+
+        self._build_failure_links()
+
+    def _add_pattern(self, pattern: bytes, term_index: int):
+        node = 0
+        for char in pattern:
+            next_node = self.children[node].get(char)
+            if next_node is None:
+                next_node = len(self.children)
+                self.children[node][char] = next_node
+                self.children.append({})
+                self.fail.append(0)
+                self.outputs.append([])
+            node = next_node
+        self.outputs[node].append(term_index)
+
+    def _build_failure_links(self):
+        queue = deque(self.children[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.children[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and char not in self.children[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.children[fallback].get(char, 0)
+                self.fail[child] = target if target != child else 0
+                self.outputs[child].extend(self.outputs[self.fail[child]])
+
+    def count(self, lines: Iterable[bytes]) -> list[int]:
+        counts = [0] * len(self.terms)
+        children = self.children
+        fail = self.fail
+        outputs = self.outputs
+        for line in lines:
+            node = 0
+            for char in line:
+                while node and char not in children[node]:
+                    node = fail[node]
+                node = children[node].get(char, 0)
+                for term_index in outputs[node]:
+                    counts[term_index] += 1
+        return counts
+
+
+def iter_grid_lines(grid: np.ndarray) -> Iterator[bytes]:
+    height, width = grid.shape
+    for row in grid:
+        yield row.tobytes()
+    for column in grid.T:
+        yield column.tobytes()
+    flipped = grid[:, ::-1]
+    for offset in range(-(height - 1), width):
+        yield grid.diagonal(offset).tobytes()
+        yield flipped.diagonal(offset).tobytes()
+
+
+def count_terms(grid: np.ndarray, terms: Iterable[str]) -> dict[str, int]:
+    unique_terms = list(dict.fromkeys(terms))
+    automaton = TermAutomaton(unique_terms)
+    counts = automaton.count(iter_grid_lines(grid))
+    return dict(zip(unique_terms, counts))
 
 
 def solve_problem_1(file_contents: str, search_term: str):
-    lines = file_contents.split()
-    num_lines = len(lines)
-    line_lengths = [len(line) for line in lines]
-    assert all([length == line_lengths[0] for length in line_lengths])
-    line_length = line_lengths[0]
+    grid = load_grid(file_contents)
+    num_lines, line_length = grid.shape
 
     print(f"Puzzle dimensions: x {line_length}, y {num_lines}")
-    assert line_length == num_lines
 
-    char_grid = [list(line) for line in lines]
+    letter_index = build_letter_index(grid)
+    found = {
+        direction: len(
+            find_anchored_instances(grid, letter_index, search_term, direction)[0]
+        )
+        for direction in DIRECTIONS
+    }
 
-    horizontal_found = find_horizontal_instances(char_grid, search_term)
+    horizontal_found = found[(1, 0)] + found[(-1, 0)]
     print(f"Horizontal: {horizontal_found}")
 
-    # TODO: Figure out how this works
-    transposed = list(map(list, zip(*char_grid)))
-    vertical_instances_found = find_horizontal_instances(transposed, search_term)
+    vertical_instances_found = found[(0, 1)] + found[(0, -1)]
     print(f"Vertical: {vertical_instances_found}")
 
-    left_to_right_diag = find_diagonal_instances_left_to_right(char_grid, search_term)
+    left_to_right_diag = found[(1, 1)] + found[(-1, -1)]
     print(left_to_right_diag)
-    flipped = [line[::-1] for line in char_grid]
-    right_to_left_diag = find_diagonal_instances_left_to_right(flipped, search_term)
+    right_to_left_diag = found[(-1, 1)] + found[(1, -1)]
     print(right_to_left_diag)
 
     total_occurrences = (
@@ -66,41 +385,24 @@ def solve_problem_1(file_contents: str, search_term: str):
 
 
 def solve_problem_2(file_contents: str, search_term: str):
-    lines = file_contents.split()
-    char_grid = [list(line) for line in lines]
-
-    found = 0
-
-    # TODO: Check off by one
-    for a_center_x in range(1, len(char_grid) - 1):
-        for a_center_y in range(1, len(char_grid) - 1):
-            center = char_grid[a_center_x][a_center_y]
-            if center != "A":
-                continue
-            left_diag_corners = set(
-                (
-                    char_grid[a_center_x - 1][a_center_y - 1],
-                    char_grid[a_center_x + 1][a_center_y + 1],
-                )
-            )
-            if "M" not in left_diag_corners or "S" not in left_diag_corners:
-                continue
-            right_diag_corners = set(
-                (
-                    char_grid[a_center_x - 1][a_center_y + 1],
-                    char_grid[a_center_x + 1][a_center_y - 1],
-                )
-            )
-            if "M" not in right_diag_corners or "S" not in right_diag_corners:
-                continue
-            found += 1
+    grid = load_grid(file_contents)
+    letter_index = build_letter_index(grid)
+
+    found = count_anchored_x_instances(grid, letter_index, search_term)
 
     print(f"Found {found} X-MASes")
 
 
 if __name__ == "__main__":
     p = Path(sys.argv[1])
-    file_contents = p.read_text()
 
-    solve_problem_1(file_contents, "XMAS")
-    solve_problem_2(file_contents, "MAS")
+    if "--banded" in sys.argv[2:]:
+        # Memory-map the file and split the work across a process pool
+        total_occurrences, x_found = solve_banded(p, "XMAS", "MAS")
+        print(f"Total occurrences: {total_occurrences}")
+        print(f"Found {x_found} X-MASes")
+    else:
+        file_contents = p.read_text()
+
+        solve_problem_1(file_contents, "XMAS")
+        solve_problem_2(file_contents, "MAS")
@@ -1,35 +1,63 @@
 from pathlib import Path
+from collections import deque
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+
+
+@dataclass
+class RuleIndex:
+    page_ids: dict[str, int]
+    # Bitsets per page id of the pages that have to come after/before it
+    successors: list[int]
+    predecessors: list[int]
+
+
+def compile_rules(rules: Iterable[tuple[str, str]]) -> RuleIndex:
+    page_ids: dict[str, int] = {}
+    successors: list[int] = []
+    predecessors: list[int] = []
+    for before, after in rules:
+        for page in (before, after):
+            if page not in page_ids:
+                page_ids[page] = len(successors)
+                successors.append(0)
+                predecessors.append(0)
+        successors[page_ids[before]] |= 1 << page_ids[after]
+        predecessors[page_ids[after]] |= 1 << page_ids[before]
+
+    return RuleIndex(page_ids, successors, predecessors)
+
+
+def parse_rules(lines: Iterator[str]) -> Iterator[tuple[str, str]]:
+    # Consumes the rule section, stopping at the blank line before the updates
+    for line in lines:
+        if line.strip() == "":
+            return
+        split = line.strip().split("|")
+        assert len(split) == 2
+        yield (split[0], split[1])
 
 
-input_text = (Path(__file__).parent / "input.txt").read_text()
-
-rules = []
-updates = []
-
-for line in input_text.splitlines():
-    if line.strip() == "":
-        continue
-    if "|" in line:
-        split = line.split("|")
-        assert len(split) == 2
-        rule = (split[0], split[1])
-        rules.append(rule)
-    if "," in line:
-        update = line.split(",")
+def parse_updates(lines: Iterable[str]) -> Iterator[list[str]]:
+    for line in lines:
+        if line.strip() == "":
+            continue
+        update = line.strip().split(",")
         assert len(update) % 2 == 1
-        updates.append(update)
+        yield update
 
 
-def update_is_valid(update: list[str], rules: list[tuple[str, str]]) -> bool:
-    for rule in rules:
-        before = rule[0]
-        after = rule[1]
-
-        if before not in update or after not in update:
+def update_is_valid(update: list[str], rule_index: RuleIndex) -> bool:
+    # An update is invalid as soon as a page must come before one we've
+    # already seen earlier in the update
+    seen = 0
+    for page in update:
+        page_id = rule_index.page_ids.get(page)
+        if page_id is None:
             continue
-
-        if update.index(before) > update.index(after):
+        if rule_index.successors[page_id] & seen:
             return False
+        seen |= 1 << page_id
 
     return True
 
@@ -38,36 +66,113 @@ def get_middle_number(update: list[str]) -> int:
     return int(update[len(update) // 2])
 
 
-valid_updates = [update for update in updates if update_is_valid(update, rules)]
-
-
-print(sum([get_middle_number(update) for update in valid_updates]))
-
-invalid_updates = [update for update in updates if not update_is_valid(update, rules)]
-
-
-def reorder_update(update: list[str], rules: list[tuple[str, str]]) -> list[str]:
-    for rule in rules:
-        before = rule[0]
-        after = rule[1]
-
-        if before not in update or after not in update:
+def get_update_mask(update: list[str], rule_index: RuleIndex) -> int:
+    mask = 0
+    for page in update:
+        page_id = rule_index.page_ids.get(page)
+        if page_id is not None:
+            mask |= 1 << page_id
+    return mask
+
+
+def count_predecessors_in_update(
+    page: str, update_mask: int, rule_index: RuleIndex
+) -> int:
+    page_id = rule_index.page_ids.get(page)
+    if page_id is None:
+        return 0
+    return (rule_index.predecessors[page_id] & update_mask).bit_count()
+
+
+def reorder_update(update: list[str], rule_index: RuleIndex) -> list[str]:
+    # Topologically sort the rule subgraph induced by the update's pages
+    update_mask = get_update_mask(update, rule_index)
+    positions = {rule_index.page_ids.get(page): i for i, page in enumerate(update)}
+    remaining_predecessors = [
+        count_predecessors_in_update(page, update_mask, rule_index) for page in update
+    ]
+
+    ready = deque(i for i, count in enumerate(remaining_predecessors) if count == 0)
+    reordered = []
+    while ready:
+        i = ready.popleft()
+        reordered.append(update[i])
+        page_id = rule_index.page_ids.get(update[i])
+        if page_id is None:
             continue
 
-        if update.index(before) > update.index(after):
-            update[update.index(before)], update[update.index(after)] = (
-                update[update.index(after)],
-                update[update.index(before)],
-            )
-
-    return update
-
-
-reordered_updates = []
-for invalid_update in invalid_updates:
-    while not update_is_valid(invalid_update, rules):
-        reorder_update(invalid_update, rules)
-    reordered_updates.append(invalid_update)
-
-
-print(sum([get_middle_number(update) for update in reordered_updates]))
+        followers = rule_index.successors[page_id] & update_mask
+        while followers:
+            lowest_bit = followers & -followers
+            followers ^= lowest_bit
+            j = positions[lowest_bit.bit_length() - 1]
+            remaining_predecessors[j] -= 1
+            if remaining_predecessors[j] == 0:
+                ready.append(j)
+
+    assert len(reordered) == len(update), "Rules for this update contain a cycle"
+    return reordered
+
+
+def get_middle_page(update: list[str], rule_index: RuleIndex) -> str:
+    # When the rules order every pair of pages, the pages have 0..k-1 direct
+    # predecessors in the update, one page each, and the middle page is the one
+    # with exactly half of the others before it, so there's no need to sort.
+    # Otherwise the counts don't give positions, so fall back to reordering.
+    update_mask = get_update_mask(update, rule_index)
+    predecessor_counts = [
+        count_predecessors_in_update(page, update_mask, rule_index) for page in update
+    ]
+    if sorted(predecessor_counts) == list(range(len(update))):
+        return update[predecessor_counts.index(len(update) // 2)]
+
+    return reorder_update(update, rule_index)[len(update) // 2]
+
+
+@dataclass
+class UpdateVerdict:
+    update: list[str]
+    is_valid: bool
+    # Middle page of the update once it's in a valid order
+    middle_page: int
+    # Running sums over every update checked so far
+    valid_middle_sum: int
+    reordered_middle_sum: int
+
+
+def check_updates(
+    updates: Iterable[list[str]], rule_index: RuleIndex
+) -> Iterator[UpdateVerdict]:
+    valid_middle_sum = 0
+    reordered_middle_sum = 0
+    for update in updates:
+        is_valid = update_is_valid(update, rule_index)
+        if is_valid:
+            middle_page = get_middle_number(update)
+            valid_middle_sum += middle_page
+        else:
+            middle_page = int(get_middle_page(update, rule_index))
+            reordered_middle_sum += middle_page
+
+        yield UpdateVerdict(
+            update, is_valid, middle_page, valid_middle_sum, reordered_middle_sum
+        )
+
+
+def check_stream(lines: Iterable[str]) -> Iterator[UpdateVerdict]:
+    # Parses the rule section once, then checks the updates lazily as they're
+    # read, e.g. straight from an open file
+    line_iterator = iter(lines)
+    rule_index = compile_rules(parse_rules(line_iterator))
+    yield from check_updates(parse_updates(line_iterator), rule_index)
+
+
+if __name__ == "__main__":
+    with (Path(__file__).parent / "input.txt").open() as f:
+        last_verdict = None
+        for last_verdict in check_stream(f):
+            pass
+
+    assert last_verdict is not None
+    print(last_verdict.valid_middle_sum)
+    print(last_verdict.reordered_middle_sum)
@@ -1,87 +1,284 @@
+import sys
+
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-import copy
-
-input_txt = (Path(__file__).parent / "input.txt").read_text()
-
-grid: list[list[str]] = [list(line) for line in input_txt.splitlines()]
-
-guard_pos = None
-for y, y_line in enumerate(grid):
-    if "^" in y_line:
-        guard_pos = (y_line.index("^"), y)
-        grid[guard_pos[1]][guard_pos[0]] = "."
-
-assert guard_pos is not None
-
-print(guard_pos)
-
-
-# Loop
-def walk_guard(guard_pos: tuple[int, int], grid: list[list[str]]) -> tuple[int, bool]:
-    guard_on_map = True
-    guard_direction = "^"
-    visited_positions = set()
-    visited_positions.add(guard_pos)
-
-    loop_positions = set()
-    loop_positions.add((guard_pos, guard_direction))
-
-    while guard_on_map:
-        # print(guard_pos)
-        new_guard_x = guard_pos[0]
-        new_guard_y = guard_pos[1]
-        match guard_direction:
-            case "^":
-                new_guard_y -= 1
-            case ">":
-                new_guard_x += 1
-            case "v":
-                new_guard_y += 1
-            case "<":
-                new_guard_x -= 1
-
-        if new_guard_y < 0 or new_guard_y == len(grid):
-            break
-        if new_guard_x < 0 or new_guard_x == len(grid[0]):
-            break
-
-        new_square = grid[new_guard_y][new_guard_x]
-        if new_square == "#":
-            match guard_direction:
-                case "^":
-                    guard_direction = ">"
-                case ">":
-                    guard_direction = "v"
-                case "v":
-                    guard_direction = "<"
-                case "<":
-                    guard_direction = "^"
-            # Go to the next loop iteration
-            # print("Changing direction to ", guard_direction)
-            continue
-
-        guard_pos = (new_guard_x, new_guard_y)
-        if (guard_pos, guard_direction) in loop_positions:
-            return len(visited_positions), True
-
-        visited_positions.add(guard_pos)
-        loop_positions.add((guard_pos, guard_direction))
-    return len(visited_positions), False
-
-
-print(walk_guard(guard_pos, grid))
-
-
-num_loops = 0
-for x in range(len(grid[0])):
-    print(x, len(grid[0]))
-    for y in range(len(grid)):
-        if (x, y) == guard_pos or grid[y][x] == "#":
-            continue
-        grid[y][x] = "#"
-        _, loop = walk_guard(guard_pos, grid)
-        if loop:
+
+
+def parse_grid(input_txt: str) -> tuple[list[list[str]], tuple[int, int]]:
+    grid: list[list[str]] = [list(line) for line in input_txt.splitlines()]
+
+    guard_pos = None
+    for y, y_line in enumerate(grid):
+        if "^" in y_line:
+            guard_pos = (y_line.index("^"), y)
+            grid[guard_pos[1]][guard_pos[0]] = "."
+
+    assert guard_pos is not None
+    return grid, guard_pos
+
+
+# Directions in turning order, so turning right is (direction + 1) % 4
+UP, RIGHT, DOWN, LEFT = range(4)
+# Marks a walk that leaves the map instead of stopping at an obstacle
+EXIT = -1
+
+
+class VisitedStates:
+    # Flags stamped with the current generation, so clearing them is a counter
+    # bump instead of a reset; the bytes only get wiped when the counter wraps
+    def __init__(self, size: int):
+        self.stamps = bytearray(size)
+        self.generation = 1
+
+    def clear(self):
+        self.generation += 1
+        if self.generation == 256:
+            self.stamps[:] = bytes(len(self.stamps))
+            self.generation = 1
+
+    def add(self, index: int):
+        self.stamps[index] = self.generation
+
+    def __contains__(self, index: int) -> bool:
+        return self.stamps[index] == self.generation
+
+
+class JumpTable:
+    def __init__(self, grid: list[list[str]]):
+        self.width = len(grid[0])
+        self.height = len(grid)
+        self.obstacles = bytearray(
+            1 if grid[y][x] == "#" else 0
+            for y in range(self.height)
+            for x in range(self.width)
+        )
+        # Cells are flat indices (y * width + x); steps are indexed by direction
+        self.steps = [-self.width, 1, self.width, -1]
+        # For each direction and cell, the cell the guard stops on in front of
+        # the next obstacle, or EXIT if there's no obstacle before the edge
+        self.stops = [[EXIT] * len(self.obstacles) for _ in self.steps]
+        # Scratch space shared by every walk over this table. Turn states are
+        # indexed by pos * 4 + direction.
+        self.visited_cells = VisitedStates(len(self.obstacles))
+        self.turn_states = VisitedStates(len(self.obstacles) * 4)
+
+        for y in range(self.height):
+            self._build_row(y)
+        for x in range(self.width):
+            self._build_column(x)
+
+    def _build_row(self, y: int):
+        row = range(y * self.width, (y + 1) * self.width)
+        stop = EXIT
+        for pos in row:
+            if self.obstacles[pos]:
+                stop = pos + 1
+            self.stops[LEFT][pos] = stop
+        stop = EXIT
+        for pos in reversed(row):
+            if self.obstacles[pos]:
+                stop = pos - 1
+            self.stops[RIGHT][pos] = stop
+
+    def _build_column(self, x: int):
+        column = range(x, self.width * self.height, self.width)
+        stop = EXIT
+        for pos in column:
+            if self.obstacles[pos]:
+                stop = pos + self.width
+            self.stops[UP][pos] = stop
+        stop = EXIT
+        for pos in reversed(column):
+            if self.obstacles[pos]:
+                stop = pos - self.width
+            self.stops[DOWN][pos] = stop
+
+    # Only the obstacle's row and column can change, so just rebuild those
+    def place_obstacle(self, x: int, y: int):
+        self.obstacles[y * self.width + x] = 1
+        self._build_row(y)
+        self._build_column(x)
+
+    def remove_obstacle(self, x: int, y: int):
+        self.obstacles[y * self.width + x] = 0
+        self._build_row(y)
+        self._build_column(x)
+
+    def edge(self, pos: int, direction: int) -> int:
+        # The last cell on the map when walking from pos in direction
+        x = pos % self.width
+        if direction == UP:
+            return x
+        if direction == RIGHT:
+            return pos - x + self.width - 1
+        if direction == DOWN:
+            return (self.height - 1) * self.width + x
+        return pos - x
+
+
+def walk_guard(guard_pos: tuple[int, int], table: JumpTable) -> tuple[int, bool]:
+    pos = guard_pos[1] * table.width + guard_pos[0]
+    guard_direction = UP
+    visited_positions = table.visited_cells
+    visited_positions.clear()
+    num_visited = 0
+
+    # The guard only changes course at turns, so those are the only states
+    # that need remembering to spot a loop
+    turn_positions = table.turn_states
+    turn_positions.clear()
+
+    while True:
+        stop = table.stops[guard_direction][pos]
+        step = table.steps[guard_direction]
+        end = stop if stop != EXIT else table.edge(pos, guard_direction)
+        for cell in range(pos, end + step, step):
+            if cell not in visited_positions:
+                visited_positions.add(cell)
+                num_visited += 1
+
+        if stop == EXIT:
+            return num_visited, False
+        if stop * 4 + guard_direction in turn_positions:
+            return num_visited, True
+
+        turn_positions.add(stop * 4 + guard_direction)
+        pos = stop
+        guard_direction = (guard_direction + 1) % 4
+
+
+def guard_loops(table: JumpTable, pos: int, guard_direction: int) -> bool:
+    turn_positions = table.turn_states
+    turn_positions.clear()
+    while True:
+        stop = table.stops[guard_direction][pos]
+        if stop == EXIT:
+            return False
+        if stop * 4 + guard_direction in turn_positions:
+            return True
+
+        turn_positions.add(stop * 4 + guard_direction)
+        pos = stop
+        guard_direction = (guard_direction + 1) % 4
+
+
+def trace_first_visits(
+    guard_pos: tuple[int, int], table: JumpTable
+) -> dict[int, tuple[int, int]]:
+    # Maps each cell on the patrol route, other than the start, to the guard's
+    # position and direction just before first stepping onto it
+    start_pos = guard_pos[1] * table.width + guard_pos[0]
+    pos = start_pos
+    guard_direction = UP
+    first_visits: dict[int, tuple[int, int]] = {}
+    turn_positions = table.turn_states
+    turn_positions.clear()
+
+    while True:
+        stop = table.stops[guard_direction][pos]
+        step = table.steps[guard_direction]
+        end = stop if stop != EXIT else table.edge(pos, guard_direction)
+        for cell in range(pos + step, end + step, step):
+            if cell != start_pos and cell not in first_visits:
+                first_visits[cell] = (cell - step, guard_direction)
+
+        if stop == EXIT or stop * 4 + guard_direction in turn_positions:
+            return first_visits
+
+        turn_positions.add(stop * 4 + guard_direction)
+        pos = stop
+        guard_direction = (guard_direction + 1) % 4
+
+
+def count_off_route_loops(
+    guard_pos: tuple[int, int],
+    table: JumpTable,
+    first_visits: dict[int, tuple[int, int]],
+) -> int:
+    # An obstacle off the original route never gets walked into, so it leaves
+    # the original walk as it was. If that walk already loops, every free cell
+    # off the route (other than the start) is a loop-making obstacle too.
+    start_pos = guard_pos[1] * table.width + guard_pos[0]
+    if not guard_loops(table, start_pos, UP):
+        return 0
+    return table.obstacles.count(0) - 1 - len(first_visits)
+
+
+def count_loop_obstacles(
+    table: JumpTable, candidates: Iterable[tuple[int, tuple[int, int]]]
+) -> int:
+    # Candidates come from trace_first_visits, i.e. only cells on the original
+    # route; off-route cells are handled by count_off_route_loops. Up to the
+    # first time the guard reaches a candidate the walk is unchanged, so resume
+    # from just before that point.
+    num_loops = 0
+    for cell, (pos, guard_direction) in candidates:
+        x, y = cell % table.width, cell // table.width
+        table.place_obstacle(x, y)
+        if guard_loops(table, pos, guard_direction):
             num_loops += 1
-        grid[y][x] = "."
+        table.remove_obstacle(x, y)
+
+    return num_loops
+
+
+# Each worker process builds its own jump table once from the shared map and
+# reuses it for every chunk of candidates it's handed
+worker_table: JumpTable | None = None
+
+
+def init_worker(grid_rows: tuple[str, ...]):
+    global worker_table
+    worker_table = JumpTable([list(row) for row in grid_rows])
+
+
+def count_loop_obstacles_in_worker(
+    candidates: list[tuple[int, tuple[int, int]]],
+) -> int:
+    assert worker_table is not None
+    return count_loop_obstacles(worker_table, candidates)
+
+
+def count_loop_obstacles_parallel(
+    grid: list[list[str]],
+    guard_pos: tuple[int, int],
+    max_workers: int | None = None,
+    chunk_size: int = 256,
+) -> int:
+    table = JumpTable(grid)
+    first_visits = trace_first_visits(guard_pos, table)
+    off_route_loops = count_off_route_loops(guard_pos, table, first_visits)
+    candidates = list(first_visits.items())
+    chunks = [
+        candidates[i : i + chunk_size] for i in range(0, len(candidates), chunk_size)
+    ]
+    grid_rows = tuple("".join(row) for row in grid)
+
+    with ProcessPoolExecutor(
+        max_workers, initializer=init_worker, initargs=(grid_rows,)
+    ) as executor:
+        return off_route_loops + sum(
+            executor.map(count_loop_obstacles_in_worker, chunks)
+        )
+
+
+if __name__ == "__main__":
+    input_txt = (Path(__file__).parent / "input.txt").read_text()
+    grid, guard_pos = parse_grid(input_txt)
+
+    print(guard_pos)
+
+    table = JumpTable(grid)
+
+    print(walk_guard(guard_pos, table))
+
+    if "--parallel" in sys.argv[1:]:
+        num_loops = count_loop_obstacles_parallel(grid, guard_pos)
+    else:
+        first_visits = trace_first_visits(guard_pos, table)
+        num_loops = count_off_route_loops(
+            guard_pos, table, first_visits
+        ) + count_loop_obstacles(table, first_visits.items())
 
-print("Num loops", num_loops)
+    print("Num loops", num_loops)
@@ -1,41 +1,121 @@
+import itertools
+import sys
+
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-input_text = (Path(__file__).parent / "input.txt").read_text()
+ADD = "+"
+MULTIPLY = "*"
+CONCAT = "||"
+
+PART_1_OPERATORS = frozenset((ADD, MULTIPLY))
+PART_2_OPERATORS = frozenset((ADD, MULTIPLY, CONCAT))
+
 
-problems = []
+def parse_problems(lines: Iterable[str]) -> Iterator[tuple[int, list[int]]]:
+    for line in lines:
+        if line.strip() == "":
+            continue
+        colon_split = line.split(":")
+        assert len(colon_split) == 2
+        answer = int(colon_split[0])
+        components = [int(num) for num in colon_split[1].split()]
 
-for line in input_text.splitlines():
-    colon_split = line.split(":")
-    assert len(colon_split) == 2
-    answer = int(colon_split[0])
-    components = [int(num) for num in colon_split[1].split()]
+        yield (answer, components)
 
-    problems.append((answer, components))
 
+def next_power_of_ten(num: int) -> int:
+    power = 10
+    while power <= num:
+        power *= 10
+    return power
 
-def get_sum(target: int, lhs: int, components: list[int]) -> int:
-    if len(components) == 0:
-        return lhs if lhs == target else 0
-    components_copy = components[:]
-    next_elem = components_copy.pop(0)
 
-    if mult_answer := get_sum(target, lhs * next_elem, components_copy):
-        return mult_answer
-    if add_answer := get_sum(target, lhs + next_elem, components_copy):
-        return add_answer
-    if concat_answer := get_sum(
-        target, int(str(lhs) + str(next_elem)), components_copy
-    ):
-        return concat_answer
+def is_solvable(
+    target: int, components: list[int], operators: frozenset[str] = PART_2_OPERATORS
+) -> bool:
+    # Work backwards from the target, undoing the last operator at each step.
+    # Only operators that could have produced the current target are tried:
+    # * needs the operand to divide it, + needs it not to go negative and ||
+    # needs the operand's digits to be the target's suffix.
+    stack = [(target, len(components) - 1)]
+    while stack:
+        remaining, i = stack.pop()
+        next_elem = components[i]
+        if i == 0:
+            if remaining == next_elem:
+                return True
+            continue
+
+        if MULTIPLY in operators:
+            if next_elem == 0:
+                if remaining == 0:
+                    return True
+            elif remaining % next_elem == 0:
+                stack.append((remaining // next_elem, i - 1))
+        if ADD in operators and remaining >= next_elem:
+            stack.append((remaining - next_elem, i - 1))
+        if CONCAT in operators:
+            power = next_power_of_ten(next_elem)
+            if remaining % power == next_elem:
+                stack.append((remaining // power, i - 1))
 
     return False
 
 
-valid_sum = 0
-for answer, components in problems:
-    original_components = components[:]
-    first_component = components.pop(0)
-    if test_value := get_sum(answer, first_component, components):
-        valid_sum += test_value
+def solve_chunk(
+    problems: list[tuple[int, list[int]]], operators: frozenset[str]
+) -> list[bool]:
+    return [
+        is_solvable(answer, components, operators) for answer, components in problems
+    ]
+
+
+def evaluate_problems(
+    problems: Iterable[tuple[int, list[int]]],
+    operators: frozenset[str],
+    max_workers: int | None = None,
+    chunk_size: int = 1024,
+) -> tuple[list[bool], int]:
+    problems = list(problems)
+    # Hand out the longest operand lists first so the slowest lines don't end
+    # up straggling at the end of the run
+    order = sorted(
+        range(len(problems)), key=lambda i: len(problems[i][1]), reverse=True
+    )
+    chunks = [order[i : i + chunk_size] for i in range(0, len(order), chunk_size)]
+
+    results = [False] * len(problems)
+    with ProcessPoolExecutor(max_workers) as executor:
+        chunk_results = executor.map(
+            solve_chunk,
+            ([problems[i] for i in chunk] for chunk in chunks),
+            itertools.repeat(operators),
+        )
+        for chunk, solved in zip(chunks, chunk_results):
+            for i, is_valid in zip(chunk, solved):
+                results[i] = is_valid
+
+    calibration_sum = sum(
+        answer for (answer, _), is_valid in zip(problems, results) if is_valid
+    )
+    return results, calibration_sum
+
+
+if __name__ == "__main__":
+    input_text = (Path(__file__).parent / "input.txt").read_text()
+    problems = list(parse_problems(input_text.splitlines()))
+
+    if "--parallel" in sys.argv[1:]:
+        for operators in (PART_1_OPERATORS, PART_2_OPERATORS):
+            _, valid_sum = evaluate_problems(problems, operators)
+            print(valid_sum)
+    else:
+        for operators in (PART_1_OPERATORS, PART_2_OPERATORS):
+            valid_sum = 0
+            for answer, components in problems:
+                if is_solvable(answer, components, operators):
+                    valid_sum += answer
 
-print(valid_sum)
+            print(valid_sum)
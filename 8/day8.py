@@ -1,58 +1,110 @@
 from pathlib import Path
 from collections import defaultdict
+from collections.abc import Iterable, Iterator
 import itertools
+import math
+import re
+import sys
 
-input_text = (Path(__file__).parent / "input.txt").read_text()
+import numpy as np
 
-grid: list[list[str]] = [list(line.strip()) for line in input_text.splitlines()]
 
-grid_size = (len(grid[0]), len(grid))
-grid_locations: dict[str, list[tuple[int, int]]] = defaultdict(list)
-for y in range(grid_size[1]):
-    for x in range(grid_size[0]):
-        char = grid[y][x]
-        if char != ".":
-            grid_locations[char].append((x, y))
+def parse_antennas(
+    lines: Iterable[str],
+) -> tuple[dict[str, list[tuple[int, int]]], tuple[int, int]]:
+    # Only the antenna coordinates are kept, so the map is never held in memory
+    grid_locations: dict[str, list[tuple[int, int]]] = defaultdict(list)
+    width = 0
+    height = 0
+    for y, line in enumerate(lines):
+        line = line.strip()
+        width = max(width, len(line))
+        height = y + 1
+        for match in re.finditer(r"[^.]", line):
+            grid_locations[match.group()].append((match.start(), y))
 
-print(grid_size)
+    return grid_locations, (width, height)
 
 
-def get_antinode_locations(
-    locations: list[tuple[int, int]], grid_size: tuple[int, int]
-) -> set[tuple[int, int]]:
-    antinode_locations = set()
-    for node_one, node_two in itertools.permutations(locations, 2):
+def iter_antinode_locations(
+    locations: list[tuple[int, int]],
+    grid_size: tuple[int, int],
+    reduce_steps: bool = False,
+) -> Iterator[tuple[int, int]]:
+    # Each pair of antennas is only visited once; its line is walked outwards
+    # in both directions from the first antenna. With reduce_steps the step is
+    # divided by its gcd, so every grid point on the line counts.
+    for node_one, node_two in itertools.combinations(locations, 2):
         x_difference = node_two[0] - node_one[0]
         y_difference = node_two[1] - node_one[1]
+        if reduce_steps:
+            divisor = math.gcd(x_difference, y_difference)
+            x_difference //= divisor
+            y_difference //= divisor
 
-        i = 0.0
-        while True:
-            new_location = (
-                i * x_difference + node_one[0],
-                i * y_difference + node_one[1],
-            )
-            assert new_location[0].is_integer()
-            assert new_location[1].is_integer()
-            new_location = (int(new_location[0]), int(new_location[1]))
-            if (
-                new_location[0] >= grid_size[0]
-                or new_location[0] < 0
-                or new_location[1] >= grid_size[1]
-                or new_location[1] < 0
-            ):
-                break
-            antinode_locations.add(new_location)
-            i += 1
-
-    return antinode_locations
-
-
-antinode_locations_by_antenna = [
-    get_antinode_locations(grid_locations[antenna], grid_size)
-    for antenna in grid_locations.keys()
-]
-
-antinode_locations: set[tuple[int, int]] = set()
-antinode_locations.update(*antinode_locations_by_antenna)
-
-print(len(antinode_locations))
+        x, y = node_one
+        while 0 <= x < grid_size[0] and 0 <= y < grid_size[1]:
+            yield (x, y)
+            x += x_difference
+            y += y_difference
+
+        x, y = node_one[0] - x_difference, node_one[1] - y_difference
+        while 0 <= x < grid_size[0] and 0 <= y < grid_size[1]:
+            yield (x, y)
+            x -= x_difference
+            y -= y_difference
+
+
+def count_antinodes(
+    grid_locations: dict[str, list[tuple[int, int]]],
+    grid_size: tuple[int, int],
+    reduce_steps: bool = False,
+) -> int:
+    # Same walk as iter_antinode_locations, but vectorized over every pair of
+    # a frequency at once and marked into one grid shared by all frequencies
+    antinodes = np.zeros((grid_size[1], grid_size[0]), dtype=bool)
+    bounds = np.array(grid_size)
+    for locations in grid_locations.values():
+        nodes = np.array(locations, dtype=np.int64).reshape(-1, 2)
+        first, second = np.triu_indices(len(nodes), k=1)
+        steps = nodes[second] - nodes[first]
+        if reduce_steps:
+            steps //= np.gcd(steps[:, 0], steps[:, 1])[:, None]
+
+        points = np.concatenate([nodes[first], nodes[first] - steps])
+        steps = np.concatenate([steps, -steps])
+        while len(points) > 0:
+            in_bounds = np.all((points >= 0) & (points < bounds), axis=1)
+            points = points[in_bounds]
+            steps = steps[in_bounds]
+            antinodes[points[:, 1], points[:, 0]] = True
+            points += steps
+
+    return int(np.count_nonzero(antinodes))
+
+
+def count_antinodes_sparse(
+    grid_locations: dict[str, list[tuple[int, int]]],
+    grid_size: tuple[int, int],
+    reduce_steps: bool = False,
+) -> int:
+    # Antinodes are collected per row, so memory grows with the number of
+    # antinodes rather than the area of the map
+    antinode_rows: dict[int, set[int]] = defaultdict(set)
+    for locations in grid_locations.values():
+        for x, y in iter_antinode_locations(locations, grid_size, reduce_steps):
+            antinode_rows[y].add(x)
+
+    return sum(len(row) for row in antinode_rows.values())
+
+
+if __name__ == "__main__":
+    with (Path(__file__).parent / "input.txt").open() as f:
+        grid_locations, grid_size = parse_antennas(f)
+
+    print(grid_size)
+
+    if "--sparse" in sys.argv[1:]:
+        print(count_antinodes_sparse(grid_locations, grid_size))
+    else:
+        print(count_antinodes(grid_locations, grid_size))
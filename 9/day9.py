@@ -1,122 +1,138 @@
 from pathlib import Path
-
-input_text = (Path(__file__).parent / "input.txt").read_text()
-
-dense_disk_map = [int(char) for char in input_text]
-
-FREE_SPACE_MARKER = -1
-
-expanded_disk_map = []
-unfragmented_disk_map = []
-current_id = 0
-for i, num in enumerate(dense_disk_map):
-    if num == 0:
-        continue
-    is_file_marker = i % 2 == 0
-    if is_file_marker:
-        # Can't do this because IDs won't be preserved
-        unfragmented_disk_map.append((current_id, num))
-        expanded_disk_map.extend([current_id] * num)
-        current_id += 1
-    else:
-        # It's free space
-        unfragmented_disk_map.append((FREE_SPACE_MARKER, num))
-        expanded_disk_map.extend([FREE_SPACE_MARKER] * num)
-
-rightmost_file_index = len(expanded_disk_map) - 1
-for i in range(len(expanded_disk_map)):
-    if expanded_disk_map[i] != FREE_SPACE_MARKER:
-        continue
-
-    if expanded_disk_map[rightmost_file_index] == FREE_SPACE_MARKER:
-        for j in reversed(range(i + 1, rightmost_file_index + 1)):
-            if expanded_disk_map[j] != FREE_SPACE_MARKER:
-                rightmost_file_index = j
-                break
-        else:
-            break
-
-    expanded_disk_map[i], expanded_disk_map[rightmost_file_index] = (
-        expanded_disk_map[rightmost_file_index],
-        expanded_disk_map[i],
-    )
-
-checksum = 0
-for i in range(len(expanded_disk_map)):
-    if expanded_disk_map[i] == FREE_SPACE_MARKER:
-        continue
-    checksum += i * int(expanded_disk_map[i])
-print(checksum)
-
-defragged_ids: set[int] = set()
-
-
-def unfragment_one_file(
-    disk_map: list[tuple[int, int]], defragmented_file_ids: set[int]
-) -> bool:
-    # Now do a defragmentation of the unfragmented disk map
-    for i in reversed(range(len(disk_map))):
-        fragment = disk_map[i]
-        fragment_id = fragment[0]
-        fragment_size = fragment[1]
-        if fragment_id == FREE_SPACE_MARKER or fragment_id in defragmented_file_ids:
+from collections.abc import Iterator, Sequence
+from typing import overload
+import heapq
+import mmap
+
+
+class DenseDiskMap(Sequence[int]):
+    # Reads the digits straight out of a memory-mapped file, so the disk map is
+    # never loaded or boxed up front; iterating goes through it in chunks
+    def __init__(self, buffer: mmap.mmap, chunk_size: int = 1 << 20):
+        self.buffer = buffer
+        self.chunk_size = chunk_size
+        self.length = len(buffer)
+        while self.length > 0 and buffer[self.length - 1] in b"\r\n":
+            self.length -= 1
+
+    def __len__(self) -> int:
+        return self.length
+
+    @overload
+    def __getitem__(self, index: int) -> int: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[int]: ...
+
+    def __getitem__(self, index: int | slice) -> int | list[int]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.length))]
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError(index)
+        return self.buffer[index] - ord("0")
+
+    def __iter__(self) -> Iterator[int]:
+        for chunk_start in range(0, self.length, self.chunk_size):
+            chunk = self.buffer[
+                chunk_start : min(chunk_start + self.chunk_size, self.length)
+            ]
+            for char in chunk:
+                yield char - ord("0")
+
+
+def span_checksum(file_id: int, start: int, size: int) -> int:
+    # Sum of (start + j) * file_id for j in range(size), as an arithmetic series
+    return file_id * (start * size + size * (size - 1) // 2)
+
+
+def compact_blocks_checksum(dense_disk_map: Sequence[int]) -> int:
+    # Two pointers over the dense map's runs: files are placed in order from
+    # the left, and each free span is filled with blocks taken off the end of
+    # the rightmost file that hasn't been fully moved yet
+    left = 0
+    right = (len(dense_disk_map) - 1) // 2 * 2
+    right_remaining = dense_disk_map[right]
+    position = 0
+    checksum = 0
+    while left < right:
+        size = dense_disk_map[left]
+        checksum += span_checksum(left // 2, position, size)
+        position += size
+
+        free_size = dense_disk_map[left + 1]
+        while free_size > 0 and left < right:
+            moved = min(free_size, right_remaining)
+            checksum += span_checksum(right // 2, position, moved)
+            position += moved
+            free_size -= moved
+            right_remaining -= moved
+            if right_remaining == 0:
+                right -= 2
+                right_remaining = dense_disk_map[right]
+
+        left += 2
+
+    # Whatever is left of the last file stays where the compaction ends
+    if left == right:
+        checksum += span_checksum(right // 2, position, right_remaining)
+
+    return checksum
+
+
+def compact_whole_files(
+    dense_disk_map: Sequence[int],
+) -> Iterator[tuple[int, int, int]]:
+    # Index the free spans by size: free_spans[size] is a heap of the start
+    # offsets of every free span that's exactly that big. The dense map only
+    # has single digits, so there are at most 10 heaps.
+    free_spans: list[list[int]] = [[] for _ in range(10)]
+    disk_size = 0
+    for i, num in enumerate(dense_disk_map):
+        if i % 2 == 1 and num > 0:
+            heapq.heappush(free_spans[num], disk_size)
+        disk_size += num
+
+    # Walk the files from the right, tracking where each one starts. Files
+    # only ever move left, past every file still to be placed, so the space
+    # they free up can never be used again.
+    file_end = disk_size
+    for i in reversed(range(len(dense_disk_map))):
+        size = dense_disk_map[i]
+        file_start = file_end - size
+        file_end = file_start
+        if i % 2 == 1 or size == 0:
             continue
 
-        for j in range(i):
-            free_space_fragment = disk_map[j]
-            free_space_fragment_id = free_space_fragment[0]
-            free_space_fragment_size = free_space_fragment[1]
-            if (
-                free_space_fragment_id != FREE_SPACE_MARKER
-                or free_space_fragment_size < fragment_size
-            ):
-                continue
-
-            disk_map[i], disk_map[j] = (FREE_SPACE_MARKER, fragment_size), fragment
-            size_differential = free_space_fragment_size - fragment_size
-            if size_differential > 0:
-                disk_map.insert(j + 1, (FREE_SPACE_MARKER, size_differential))
-            defragmented_file_ids.add(fragment_id)
-            return False
-
-    return True
-
-
-# Jank but whatever
-while True:
-    done = unfragment_one_file(unfragmented_disk_map, defragged_ids)
-    if done:
-        print("Done defragmenting!")
-        break
-
-final_disk_map = []
-
-current_free_space_span = (FREE_SPACE_MARKER, 0)
-for elem in unfragmented_disk_map:
-    if elem[0] != FREE_SPACE_MARKER:
-        if current_free_space_span[1] > 0:
-            final_disk_map.append(current_free_space_span)
-            current_free_space_span = (FREE_SPACE_MARKER, 0)
-        final_disk_map.append(elem)
-    else:
-        current_free_space_span = (
-            FREE_SPACE_MARKER,
-            current_free_space_span[1] + elem[1],
+        # Leftmost span that's big enough, checking the top of each heap
+        span_size = None
+        span_start = file_start
+        for candidate_size in range(size, len(free_spans)):
+            heap = free_spans[candidate_size]
+            if heap and heap[0] < span_start:
+                span_start = heap[0]
+                span_size = candidate_size
+
+        if span_size is not None:
+            heapq.heappop(free_spans[span_size])
+            if span_size > size:
+                heapq.heappush(free_spans[span_size - size], span_start + size)
+
+        yield (i // 2, span_start, size)
+
+
+if __name__ == "__main__":
+    with (
+        (Path(__file__).parent / "input.txt").open("rb") as f,
+        mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer,
+    ):
+        dense_disk_map = DenseDiskMap(buffer)
+
+        print(compact_blocks_checksum(dense_disk_map))
+        print(
+            sum(
+                span_checksum(file_id, start, size)
+                for file_id, start, size in compact_whole_files(dense_disk_map)
+            )
         )
-
-if current_free_space_span[1] != 0:
-    final_disk_map.append(current_free_space_span)
-
-
-checksum = 0
-current_index = 0
-for i in range(len(final_disk_map)):
-    block_id = final_disk_map[i][0]
-    block_size = final_disk_map[i][1]
-    if block_id == FREE_SPACE_MARKER:
-        current_index += block_size
-        continue
-    for j in range(block_size):
-        checksum += (current_index + j) * block_id
-    current_index += block_size
-print(checksum)